@@ -13,6 +13,36 @@ SERP_API_KEY = os.getenv("SERP_API_KEY", "")
 MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o")
 TEMPERATURE = 0.2
 
+# Cheaper, faster model for the routing plan; the main model still writes the response
+ROUTER_MODEL_NAME = os.getenv("ROUTER_MODEL_NAME", "gpt-4o-mini")
+ROUTER_TEMPERATURE = 0.0
+ROUTER_MAX_TOKENS = 256  # enough for the RoutingDecision JSON
+
+# Cookware extraction returns a short list, one item per line
+EXTRACTION_MAX_TOKENS = 128
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+# Latency budgets (seconds) for each external call
+PLAN_TIMEOUT = float(os.getenv("PLAN_TIMEOUT", "15"))
+EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", "15"))
+RESPOND_TIMEOUT = float(os.getenv("RESPOND_TIMEOUT", "30"))
+SERP_TIMEOUT = float(os.getenv("SERP_TIMEOUT", "10"))
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "5"))
+
+# Checkpointing for queries with a thread_id. The SQLite file is shared by every worker;
+# threads idle for longer than CHECKPOINT_TTL are deleted.
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "./graph_state.db")
+CHECKPOINT_TTL = int(os.getenv("CHECKPOINT_TTL", "3600"))  # seconds
+CHECKPOINT_SWEEP_INTERVAL = int(os.getenv("CHECKPOINT_SWEEP_INTERVAL", "300"))  # seconds
+# Earlier turns of a thread that are resent to the model with each answer
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "4"))
+
+# Cache Configuration
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "1024"))
+SERP_CACHE_TTL = int(os.getenv("SERP_CACHE_TTL", "3600"))  # seconds
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "False").lower() in ("true", "1", "t")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+
 # Available cooking tools for validation
 AVAILABLE_COOKWARE: List[str] = [
     "Spatula",
@@ -1,16 +1,29 @@
+import asyncio
 import json
-from typing import List, Dict, Any, TypedDict
+import operator
+import time
+import aiosqlite
+import orjson
+from typing import Annotated, AsyncIterator, List, Dict, Any, Optional, TypedDict
 
-from langchain_core.messages import HumanMessage, SystemMessage, BaseMessage, FunctionMessage
+from langchain_core.messages import HumanMessage, SystemMessage, BaseMessage, FunctionMessage, AIMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
-from utils.llm_utils import get_llm
+from langgraph.types import Send
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from utils.llm_utils import get_llm, get_router_llm
 
-from config import AVAILABLE_COOKWARE
+from config import (
+    AVAILABLE_COOKWARE, SEMANTIC_CACHE_ENABLED, DEBUG,
+    PLAN_TIMEOUT, EXTRACTION_TIMEOUT, RESPOND_TIMEOUT, EMBEDDING_TIMEOUT,
+    CHECKPOINT_DB_PATH, CHECKPOINT_TTL, CHECKPOINT_SWEEP_INTERVAL, HISTORY_MAX_TURNS
+)
+from models.schemas import RoutingDecision
 from tools.validation import validate_query_relevance, validate_cookware
 from tools.search import search_recipes, search_cooking_question
 from tools.cooking import extract_required_cookware
+from utils.cache import LRUCache, SemanticCache, normalize_query
 from utils.logging_utils import log_step, logger
-from langchain_core.utils.function_calling import convert_to_openai_function
 
 # Define all available tools
 tools = [
@@ -21,30 +34,52 @@ tools = [
     extract_required_cookware
 ]
 
-# Format tools for OpenAI function calling
+# Map tool names to tools so the graph nodes can dispatch them
 tool_map = {
     tool.name: tool
     for tool in tools
 }
 
-# Set up the LLM with function calling 
+# Set up the LLM, plus a planner on the cheaper router model that returns a RoutingDecision in one call
 llm = get_llm()
+planner = get_router_llm().with_structured_output(RoutingDecision)
+
+# Routing decisions cached by normalized query, plus near-duplicates when enabled
+plan_cache = LRUCache()
+semantic_plan_cache = SemanticCache() if SEMANTIC_CACHE_ENABLED else None
+
+def merge_dicts(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge debug info written by parallel branches; a None value removes the key."""
+    return {key: value for key, value in {**left, **right}.items() if value is not None}
+
+# Debug info written during a turn, cleared when a checkpointed thread starts a new one
+_TURN_DEBUG_KEYS = ("relevance_check", "plan", "search", "tools", "cookware_validation")
 
 # Define the state for our graph
 class GraphState(TypedDict):
     query: str
-    messages: List[BaseMessage]
-    debug_info: Dict[str, Any]
+    # Reducers let the parallel search and identify_tools branches both write
+    messages: Annotated[List[BaseMessage], operator.add]
+    debug_info: Annotated[Dict[str, Any], merge_dicts]
     # relevant is only needed for the initial classification
     relevant: bool
+    # The routing decision made by the plan node
+    plan: Optional[RoutingDecision]
+
+# Tool results are only indented when debugging, to keep serialization cheap
+_DUMP_OPTIONS = orjson.OPT_INDENT_2 if DEBUG else 0
+
+def dump_tool_result(result: Any) -> str:
+    """Serialize a tool result for a function message."""
+    return orjson.dumps(result, option=_DUMP_OPTIONS).decode()
 
 # Define a custom tool executor function
-def execute_tool(tool_name: str, tool_input: Dict[str, Any]) -> Any:
+async def execute_tool(tool_name: str, tool_input: Dict[str, Any]) -> Any:
     """Execute a tool with the given input."""
     log_step(f"Executing tool: {tool_name}", tool_input)
     if tool_name in tool_map:
-        # Use the new .invoke() method instead of calling the tool directly
-        return tool_map[tool_name].invoke(tool_input)
+        # Use .ainvoke() so tools never block the event loop
+        return await tool_map[tool_name].ainvoke(tool_input)
     else:
         raise ValueError(f"Tool {tool_name} not found. Available tools: {list(tool_map.keys())}")
 
@@ -61,330 +96,421 @@ Follow these guidelines:
 4. When providing recipes, include ingredients, steps, and cooking times.
 5. When answering cooking questions, be detailed and educational.
 
-IMPORTANT: You will have access to various tools. Call these tools ONLY when necessary:
-- validate_query_relevance: To check if a query is cooking-related
-- search_recipes: When you need to find specific recipes
-- search_cooking_question: For general cooking information
-- extract_required_cookware: To determine what cookware is needed for a recipe
-- validate_cookware: To check if the user has the necessary cookware
+IMPORTANT: Results from these tools may be included in the conversation as function messages:
+- search_recipes: Recipes found on the web for the query
+- search_cooking_question: General cooking information found on the web
+- extract_required_cookware: The cookware needed for a recipe
+- validate_cookware: Whether the user has the necessary cookware
+
+Always base your answer on the information these tools provide.
+"""
 
-Always make tool decisions based on the specific query and what information you need.
+# Planning prompt - decides relevance and which tools to run in a single call
+planning_prompt = f"""{system_prompt}
+Before any tools are run, decide how to handle the user's query:
+- relevant: true only if the query is related to cooking, recipes, or food preparation.
+- needs_search: true if searching the web for recipes or cooking information would help answer it.
+- search_tool: search_recipes for recipe requests, search_cooking_question for other cooking questions.
+- search_query: a concise web search query, if a search is needed.
+- needs_cookware_extraction: true if the user is asking for a recipe, so its required cookware can be checked.
 """
 
+# Refusal prompt for queries the plan marked as not cooking-related
+refusal_prompt = f"""{system_prompt}
+
+For non-cooking queries, respond with: "I am a cooking assistant that specializes in recipes, cooking techniques, and food preparation. I cannot help with questions about cars, technology, or other non-cooking topics. Please feel free to ask me anything about cooking, recipes, or food preparation!\""""
+
+# Returned when the final response can't be generated within its time budget
+SERVICE_BUSY_RESPONSE = "Sorry, the cooking assistant is busy right now. Please try your question again in a moment."
+
+# The system messages never change, so build them once rather than per request
+SYSTEM_MESSAGE = SystemMessage(content=system_prompt)
+PLANNING_MESSAGE = SystemMessage(content=planning_prompt)
+REFUSAL_MESSAGE = SystemMessage(content=refusal_prompt)
+
 # Node functions
-def classify(state: GraphState) -> Dict[str, Any]:
-    """Determine if the query is relevant and route accordingly."""
-    log_step("classify")
-    
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=(
-            f"Query: {state['query']}\n\n"
-            "Is this query related to cooking, recipes, or food preparation? "
-            "Respond in only one word, with RELEVANT or NOT"
-        ))
-    ]
-    
-    # Single LLM call to determine relevance
-    response = llm.invoke(messages)
-    log_step("LLM classification response", response.content)
-    
-    # More robust relevance check
-    is_relevant = "RELEVANT" in response.content.upper()
+async def plan(state: GraphState) -> Dict[str, Any]:
+    """Classify the query and decide which tools to run, in one LLM call."""
+    log_step("plan")
+    
+    # Checkpointed threads keep earlier turns, which already start with the system message
+    messages = [] if state["messages"] else [SYSTEM_MESSAGE]
+    messages.append(HumanMessage(content=state["query"]))
+    
+    cache_key = normalize_query(state["query"])
+    decision = plan_cache.get(cache_key)
+    vector = None
+    if decision is None and semantic_plan_cache is not None:
+        try:
+            decision, vector = await asyncio.wait_for(
+                semantic_plan_cache.aget(cache_key),
+                timeout=EMBEDDING_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Query embedding timed out after {EMBEDDING_TIMEOUT}s, skipping the semantic cache")
+            decision, vector = None, None
+        except Exception as e:
+            # The cache is optional; an embeddings failure must never fail the query
+            logger.warning(f"Semantic cache lookup failed, skipping it: {str(e)}")
+            decision, vector = None, None
+        if decision is not None:
+            # A near-duplicate shares the routing, but its search text belongs to the
+            # other query; search falls back to this query's own text instead
+            decision = decision.model_copy(update={"search_query": None})
+    
+    if decision is not None:
+        log_step("Cached routing decision", decision.model_dump())
+        plan_cache.set(cache_key, decision)
+    else:
+        try:
+            # Single structured-output LLM call for relevance and routing
+            decision = await asyncio.wait_for(
+                planner.ainvoke([
+                    PLANNING_MESSAGE,
+                    HumanMessage(content=state["query"])
+                ]),
+                timeout=PLAN_TIMEOUT
+            )
+            log_step("LLM routing decision", decision.model_dump())
+            if vector is not None:
+                semantic_plan_cache.set(vector, decision)
+            plan_cache.set(cache_key, decision)
+        except asyncio.TimeoutError:
+            # Answer directly rather than wrongly refusing; don't cache the fallback
+            logger.warning(f"Planning timed out after {PLAN_TIMEOUT}s, answering without tools")
+            decision = RoutingDecision(relevant=True)
     
     return {
-        "messages": messages + [response],
-        "relevant": is_relevant,
-        "debug_info": {"relevance_check": {
-            "relevant": is_relevant,
-            "explanation": response.content
-        }}
+        "messages": messages,
+        "relevant": decision.relevant,
+        "plan": decision,
+        "debug_info": {
+            "relevance_check": {"relevant": decision.relevant},
+            "plan": decision.model_dump()
+        }
     }
 
-def search(state: GraphState) -> Dict[str, Any]:
-    """Search for relevant information or identify next step."""
+async def search(state: GraphState) -> Dict[str, Any]:
+    """Run the search tool chosen by the plan."""
     log_step("search")
     
-    messages = state["messages"]
-    debug_info = state.get("debug_info", {})
-    relevant = state.get("relevant", False)  # Preserve the relevant flag
+    decision = state["plan"]
     
-    # Prepare tools for this stage
-    available_tools = [
-        search_recipes,
-        search_cooking_question
-    ]
+    function_name = decision.search_tool
+    tool_result = await execute_tool(function_name, {"query": decision.search_query or state["query"]})
     
-    # Ask LLM what tool to use or if we can skip to next step
-    response = llm.invoke(
-        messages + [
-            HumanMessage(
-                content="I need to determine if I should search for information or can proceed with what I know."
-            )
-        ]
-    )
-    
-    messages.append(response)
-    
-    # Format tools for function calling
-    response = llm.invoke(
-        messages,
-        functions=[convert_to_openai_function(t) for t in available_tools]
-    )
-    
-    # Check if a function was called
-    function_call = response.additional_kwargs.get("function_call", None)
-    
-    if function_call:
-        # Execute tool
-        action = json.loads(function_call["arguments"])
-        function_name = function_call["name"]
-        
-        tool_result = execute_tool(function_name, action)
-        
-        # Add results to messages
-        messages.append(response)
-        messages.append(
+    # Only return the new message and debug info; the reducers merge them into the state
+    return {
+        "messages": [
             FunctionMessage(
-                content=json.dumps(tool_result, indent=2),
+                content=dump_tool_result(tool_result),
                 name=function_name  # Specify which tool produced this result
             )
-        )
-        
-        # Update debug info
-        debug_info = state["debug_info"].copy()
-        debug_info["search"] = {
-            "tool": function_name,
-            "result": tool_result
-        }
-        
-        return {
-            "messages": messages,
-            "debug_info": debug_info,
-            "relevant": relevant  # Return the preserved relevant flag
-        }
-    else:
-        # No tool was called, just update messages
-        messages.append(response)
-        
-        return {
-            "messages": messages,
-            "debug_info": debug_info,
-            "relevant": relevant  # Return the preserved relevant flag
+        ],
+        "debug_info": {
+            "search": {
+                "tool": function_name,
+                "result": tool_result
+            }
         }
+    }
 
-def identify_tools(state: GraphState) -> Dict[str, Any]:
-    """Identify what cookware is needed for the recipe."""
+async def identify_tools(state: GraphState) -> Dict[str, Any]:
+    """Identify what cookware is needed for the recipe and validate it."""
     log_step("identify_tools")
     
-    messages = state["messages"]
-    debug_info = state.get("debug_info", {})
-    relevant = state.get("relevant", False)  # Preserve the relevant flag
+    messages = []
+    debug_info = {}
     
-    # Ask LLM if we need to extract required tools
-    response = llm.invoke(
-        messages + [
-            HumanMessage(
-                content="Based on the conversation so far, should we identify the required cookware for this recipe? Answer YES or NO."
-            )
-        ]
-    )
-    
-    messages.append(response)
-    
-    # Format tool for function calling
-    response = llm.invoke(
-        messages,
-        functions=[convert_to_openai_function(extract_required_cookware)]
+    # Runs alongside search, so the recipe is described by the query alone
+    function_name = extract_required_cookware.name
+    try:
+        tool_result = await asyncio.wait_for(
+            execute_tool(function_name, {"recipe": state["query"]}),
+            timeout=EXTRACTION_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        # Skip cookware validation rather than hold up the response
+        logger.warning(f"Cookware extraction timed out after {EXTRACTION_TIMEOUT}s")
+        return {"debug_info": {"tools": {"required_cookware": [], "error": "timeout"}}}
+    required_cookware = tool_result.get("required_cookware", [])
+    
+    messages.append(
+        FunctionMessage(
+            content=dump_tool_result(tool_result),
+            name=function_name  # Specify which tool produced this result
+        )
     )
+    debug_info["tools"] = {
+        "required_cookware": required_cookware
+    }
     
-    # Check if a function was called
-    function_call = response.additional_kwargs.get("function_call", None)
-    
-    if function_call:
-        # Execute tool
-        action = json.loads(function_call["arguments"])
-        function_name = function_call["name"]
-        
-        tool_result = execute_tool(function_name, action)
+    # Validation is a local check, so it runs in this branch rather than its own node
+    if required_cookware:
+        function_name = validate_cookware.name
+        tool_result = await execute_tool(function_name, {"required_tools": required_cookware})
         
-        # Add results to messages
-        messages.append(response)
         messages.append(
             FunctionMessage(
-                content=json.dumps(tool_result, indent=2),
+                content=dump_tool_result(tool_result),
                 name=function_name  # Specify which tool produced this result
             )
         )
-        
-        # Update debug info
-        debug_info = state["debug_info"].copy()
-        debug_info["tools"] = {
-            "required_cookware": tool_result.get("required_cookware", [])
-        }
-        
-        return {
-            "messages": messages,
-            "debug_info": debug_info,
-            "relevant": relevant  # Return the preserved relevant flag
-        }
-    else:
-        # No tool was called
-        messages.append(response)
-        
-        return {
-            "messages": messages,
-            "debug_info": debug_info,
-            "relevant": relevant  # Return the preserved relevant flag
-        }
-
-def validate_cooking(state: GraphState) -> Dict[str, Any]:
-    """Validate if the user has the required cookware."""
-    log_step("validate_cooking")
-    
-    messages = state["messages"]
-    debug_info = state.get("debug_info", {})
-    relevant = state.get("relevant", False)  # Preserve the relevant flag
-    
-    required_cookware = state["debug_info"].get("tools", {}).get("required_cookware", [])
-    
-    # If we have required cookware, validate it
-    if required_cookware:
-        # Format tool for function calling
-        response = llm.invoke(
-            messages,
-            functions=[convert_to_openai_function(validate_cookware)]
-        )
-        
-        # Check if a function was called
-        function_call = response.additional_kwargs.get("function_call", None)
-        
-        if function_call:
-            # Execute tool
-            function_name = function_call["name"]
-            
-            tool_result = execute_tool(function_name, {"required_tools": required_cookware})
-            
-            # Add results to messages
-            messages.append(response)
-            messages.append(
-                FunctionMessage(
-                    content=json.dumps(tool_result, indent=2),
-                    name=function_name  # Specify which tool produced this result
-                )
-            )
-            
-            # Update debug info
-            debug_info["cookware_validation"] = tool_result
+        debug_info["cookware_validation"] = tool_result
     
     return {
         "messages": messages,
-        "debug_info": debug_info,
-        "relevant": relevant  # Return the preserved relevant flag
+        "debug_info": debug_info
     }
 
-def respond(state: GraphState) -> Dict[str, Any]:
+def _trim_history(messages: List[BaseMessage]) -> List[BaseMessage]:
+    """
+    Bound the prompt on long checkpointed threads.
+
+    Keeps the system message, the last HISTORY_MAX_TURNS earlier turns without their
+    tool results, and the whole current turn. Each turn starts with the user's query.
+    """
+    starts = [i for i, message in enumerate(messages) if isinstance(message, HumanMessage)]
+    if len(starts) <= 1:
+        return messages
+    head = [message for message in messages[:starts[0]] if isinstance(message, SystemMessage)]
+    earlier = messages[starts[max(0, len(starts) - 1 - HISTORY_MAX_TURNS)]:starts[-1]]
+    # Earlier answers already summarize their search results and cookware lists
+    earlier = [message for message in earlier if not isinstance(message, FunctionMessage)]
+    return head + earlier + messages[starts[-1]:]
+
+async def respond(state: GraphState, config: RunnableConfig) -> Dict[str, Any]:
     """Generate the final response."""
     log_step("respond")
     
     messages = state["messages"]
-    debug_info = state.get("debug_info", {})
-    relevant = state.get("relevant", False)  # Preserve the relevant flag
+    relevant = state.get("relevant", False)
     
     # If we reached this node through the non-relevant path, provide a clear cooking-focused refusal
     if relevant is False:
-        response = llm.invoke(
-            [
-                SystemMessage(content=f"{system_prompt}\n\nFor non-cooking queries, respond with: "
-                    '"I am a cooking assistant that specializes in recipes, cooking techniques, and food preparation. '
-                    'I cannot help with questions about cars, technology, or other non-cooking topics. '
-                    'Please feel free to ask me anything about cooking, recipes, or food preparation!"'),
-                HumanMessage(content=state["query"])
-            ]
-        )
+        prompt = [
+            REFUSAL_MESSAGE,
+            HumanMessage(content=state["query"])
+        ]
     else:
         # We reached this node through the normal path, generate a detailed response
-        response = llm.invoke(
-            messages + [
-                HumanMessage(
-                    content="I'll now provide a detailed response to this cooking query based on all the information gathered."
-                )
-            ]
-        )
+        prompt = _trim_history(messages) + [
+            HumanMessage(
+                content="Answer my query using the information gathered above."
+            )
+        ]
     
-    # Add the final response to messages
-    messages.append(response)
+    # Stream the generation so stream_query can forward tokens as they arrive. The config
+    # must be passed explicitly: before Python 3.11 the node's callbacks don't propagate
+    # through contextvars, so astream_events would never see these tokens.
+    async def generate():
+        response = None
+        async for chunk in llm.astream(prompt, config):
+            response = chunk if response is None else response + chunk
+        return response
     
-    return {
-        "messages": messages,
-        "debug_info": debug_info,
-        "relevant": relevant  # Return the preserved relevant flag
-    }
+    try:
+        response = await asyncio.wait_for(generate(), timeout=RESPOND_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Response generation timed out after {RESPOND_TIMEOUT}s")
+        response = AIMessage(content=SERVICE_BUSY_RESPONSE, response_metadata={"timed_out": True})
+    
+    # The messages reducer appends the final response
+    return {"messages": [response]}
 
 # Router function for conditional transitions
-def router(state: GraphState) -> str:
-    """Determine the next node based on the current state."""
-    if not state["relevant"]:
+def route_after_plan(state: GraphState):
+    """Fan out to the tool nodes the plan asked for, so they run concurrently."""
+    decision = state["plan"]
+    if not decision.relevant:
         return "respond"
     
-    if "tools" in state["debug_info"] and state["debug_info"]["tools"].get("required_cookware"):
-        return "validate_cookware"
-    
-    return "identify_tools"
+    sends = []
+    if decision.needs_search:
+        sends.append(Send("search", state))
+    if decision.needs_cookware_extraction:
+        sends.append(Send("identify_tools", state))
+    return sends or "respond"
 
 # Build the graph
-def build_recipe_graph():
-    """Build and return the recipe graph."""
+def build_recipe_graph(checkpointer=None):
+    """Build and return the recipe graph, optionally persisting its state with a checkpointer."""
     # Create the graph builder
     builder = StateGraph(GraphState)
     
     # Add nodes
-    builder.add_node("classify", classify)
+    builder.add_node("plan", plan)
     builder.add_node("search", search)
     builder.add_node("identify_tools", identify_tools)
-    builder.add_node("validate_cookware", validate_cooking)
     builder.add_node("respond", respond)
     
-    # Add edges
-    builder.add_edge(START, "classify")
-    builder.add_conditional_edges(
-        "classify",
-        lambda state: "respond" if not state["relevant"] else "search"
-    )
-    builder.add_edge("search", "identify_tools")
-    builder.add_conditional_edges(
-        "identify_tools",
-        lambda state: "validate_cookware" if "tools" in state["debug_info"] and state["debug_info"]["tools"].get("required_cookware") else "respond"
-    )
-    builder.add_edge("validate_cookware", "respond")
+    # Add edges - search and identify_tools finish in the same step, so respond runs once
+    builder.add_edge(START, "plan")
+    builder.add_conditional_edges("plan", route_after_plan, ["search", "identify_tools", "respond"])
+    builder.add_edge("search", "respond")
+    builder.add_edge("identify_tools", "respond")
     builder.add_edge("respond", END)
     
     # Compile the graph
-    return builder.compile()
+    return builder.compile(checkpointer=checkpointer)
 
-# Create an instance of the graph
-recipe_graph = build_recipe_graph()
+# The compiled graphs, built once per process. Queries with a thread_id use the
+# checkpointed graph, so a failed run can resume and later turns see earlier ones.
+_GRAPH = None
+_CHECKPOINTED_GRAPH = None
+_checkpointer: Optional[AsyncSqliteSaver] = None
+_checkpointer_lock = asyncio.Lock()
+_last_sweep = 0.0
 
-# Function to process a query
-async def process_query(query: str) -> Dict[str, Any]:
-    """Process a user query through the recipe graph."""
-    log_step("process_query", {"query": query})
-    
-    initial_state = {
+def get_graph():
+    """Return the compiled recipe graph, building it on first use."""
+    global _GRAPH
+    if _GRAPH is None:
+        _GRAPH = build_recipe_graph()
+    return _GRAPH
+
+async def get_checkpointed_graph():
+    """Return the recipe graph backed by the shared SQLite checkpointer, opening it on first use."""
+    global _CHECKPOINTED_GRAPH, _checkpointer
+    async with _checkpointer_lock:
+        if _CHECKPOINTED_GRAPH is None:
+            conn = await aiosqlite.connect(CHECKPOINT_DB_PATH)
+            _checkpointer = AsyncSqliteSaver(conn)
+            await _checkpointer.setup()
+            # Last activity per thread, so idle threads can be evicted
+            await conn.execute(
+                "CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+            )
+            await conn.commit()
+            _CHECKPOINTED_GRAPH = build_recipe_graph(checkpointer=_checkpointer)
+    return _CHECKPOINTED_GRAPH
+
+async def close_checkpointer() -> None:
+    """Close the checkpoint database connection, if one was opened."""
+    global _CHECKPOINTED_GRAPH, _checkpointer
+    if _checkpointer is not None:
+        await _checkpointer.conn.close()
+    _CHECKPOINTED_GRAPH = None
+    _checkpointer = None
+
+async def _finish_turn(thread_id: str, completed: bool) -> None:
+    """Record thread activity, drop superseded checkpoints and evict idle threads."""
+    global _last_sweep
+    conn = _checkpointer.conn
+    now = time.time()
+    
+    async with _checkpointer.lock:
+        await conn.execute(
+            "INSERT INTO thread_activity (thread_id, updated_at) VALUES (?, ?) "
+            "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+            (thread_id, now)
+        )
+        if completed:
+            # A finished run never resumes, so only the latest checkpoint is needed for the next turn
+            latest = "SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ?"
+            await conn.execute(
+                f"DELETE FROM writes WHERE thread_id = ? AND checkpoint_id < ({latest})",
+                (thread_id, thread_id)
+            )
+            await conn.execute(
+                f"DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id < ({latest})",
+                (thread_id, thread_id)
+            )
+        await conn.commit()
+    
+    if now - _last_sweep < CHECKPOINT_SWEEP_INTERVAL:
+        return
+    _last_sweep = now
+    cutoff = now - CHECKPOINT_TTL
+    async with _checkpointer.lock:
+        cursor = await conn.execute("SELECT thread_id FROM thread_activity WHERE updated_at < ?", (cutoff,))
+        idle_threads = [row[0] for row in await cursor.fetchall()]
+    for idle_thread in idle_threads:
+        await _checkpointer.adelete_thread(idle_thread)
+    async with _checkpointer.lock:
+        await conn.executemany(
+            "DELETE FROM thread_activity WHERE thread_id = ? AND updated_at < ?",
+            [(idle_thread, cutoff) for idle_thread in idle_threads]
+        )
+        await conn.commit()
+    if idle_threads:
+        log_step("Evicted idle threads", {"count": len(idle_threads)})
+
+def _initial_state(query: str) -> Dict[str, Any]:
+    """Build the graph's starting state for a query."""
+    return {
         "query": query,
         "messages": [],
-        "debug_info": {},
-        "relevant": False
+        # Clears the previous turn's entries on a checkpointed thread
+        "debug_info": {key: None for key in _TURN_DEBUG_KEYS},
+        "relevant": False,
+        "plan": None
     }
+
+async def _graph_run(query: str, thread_id: Optional[str]):
+    """Pick the graph, input and config for a query, resuming an unfinished run on the thread."""
+    if not thread_id:
+        return get_graph(), _initial_state(query), None
+    
+    graph = await get_checkpointed_graph()
+    config = {"configurable": {"thread_id": thread_id}}
+    snapshot = await graph.aget_state(config)
+    if snapshot.next and snapshot.values.get("query") == query:
+        # The last run of this query stopped partway; pick up at the node that failed
+        log_step("Resuming interrupted run", {"thread_id": thread_id, "next": list(snapshot.next)})
+        return graph, None, config
+    return graph, _initial_state(query), config
+
+async def stream_query(query: str, thread_id: Optional[str] = None) -> AsyncIterator[str]:
+    """Run a query through the recipe graph, yielding response tokens as they are generated."""
+    log_step("stream_query", {"query": query, "thread_id": thread_id})
     
+    graph, graph_input, config = await _graph_run(query, thread_id)
+    completed = False
     try:
-        final_state = None
-        for output in recipe_graph.stream(initial_state):
-            final_state = output
+        async for event in graph.astream_events(graph_input, config, version="v2"):
+            if event.get("metadata", {}).get("langgraph_node") != "respond":
+                continue
+            # Only forward the final answer, not the planner or cookware extraction calls
+            if event["event"] == "on_chat_model_stream":
+                token = event["data"]["chunk"].content
+                if token:
+                    yield token
+            elif event["event"] == "on_chain_end" and event["name"] == "respond":
+                # respond swaps in a canned reply on timeout; surface it to the client as an error
+                completed = True
+                response = (event["data"].get("output") or {}).get("messages", [None])[-1]
+                if response is not None and response.response_metadata.get("timed_out"):
+                    raise asyncio.TimeoutError(SERVICE_BUSY_RESPONSE)
+    finally:
+        if thread_id:
+            # Bookkeeping must not replace the answer or mask the run's own exception
+            try:
+                await _finish_turn(thread_id, completed)
+            except Exception:
+                logger.exception(f"Failed to record checkpoint activity for thread {thread_id}")
+
+# Function to process a query
+async def process_query(query: str, thread_id: Optional[str] = None) -> Dict[str, Any]:
+    """Process a user query through the recipe graph."""
+    log_step("process_query", {"query": query, "thread_id": thread_id})
+    
+    try:
+        graph, graph_input, config = await _graph_run(query, thread_id)
         
-        # Extract the nested state if present
-        if final_state and "respond" in final_state:
-            final_state = final_state["respond"]
+        # Stream full state values so the last one holds the merged results of every branch
+        final_state = None
+        completed = False
+        try:
+            async for output in graph.astream(graph_input, config, stream_mode="values"):
+                final_state = output
+            completed = True
+        finally:
+            if thread_id:
+                try:
+                    await _finish_turn(thread_id, completed)
+                except Exception:
+                    logger.exception(f"Failed to record checkpoint activity for thread {thread_id}")
         
         # Determine if query was relevant
         is_relevant = False
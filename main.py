@@ -1,17 +1,35 @@
+import asyncio
+from contextlib import asynccontextmanager
+import orjson
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from config import DEBUG
 
 from models.schemas import QueryRequest, QueryResponse
-from graphs.recipe_graph import process_query
+from graphs.recipe_graph import close_checkpointer, get_graph, process_query, stream_query
+from tools.search import close_serp_session, get_serp_session
+from utils.cache import normalize_query
+from utils.coalesce import coalesce
 from utils.logging_utils import logger
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the graph and open the shared SERP HTTP session on startup, releasing connections on shutdown."""
+    get_graph()
+    get_serp_session()
+    yield
+    await close_serp_session()
+    await close_checkpointer()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Recipe Chatbot API",
     description="A cooking and recipe Q&A application using LangGraph and LangChain",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware - you'll want to tighten this up in production
@@ -37,8 +55,11 @@ async def query_endpoint(request: QueryRequest):
     try:
         logger.info(f"Received query: {request.query}")
         
-        # Process the query through our recipe graph
-        result = await process_query(request.query)
+        # Process the query through our recipe graph, sharing the run with identical in-flight queries
+        result = await coalesce(
+            f"q:{request.thread_id or ''}:{normalize_query(request.query)}",
+            lambda: process_query(request.query, request.thread_id)
+        )
         
         # Return the response
         return QueryResponse(
@@ -50,6 +71,34 @@ async def query_endpoint(request: QueryRequest):
         logger.exception(f"Error processing query: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+@app.post("/api/query/stream")
+async def query_stream_endpoint(request: QueryRequest):
+    """
+    Process a cooking or recipe query, streaming the response as Server-Sent Events.
+    
+    Args:
+        request: The query request
+        
+    Returns:
+        An event stream of response tokens, then an error event on failure or timeout, ending with a [DONE] event
+    """
+    logger.info(f"Received streaming query: {request.query}")
+    
+    async def event_generator():
+        try:
+            async for token in stream_query(request.query, request.thread_id):
+                yield f"data: {orjson.dumps({'token': token}).decode()}\n\n"
+        except asyncio.TimeoutError as e:
+            logger.warning(f"Streaming query timed out: {request.query}")
+            yield f"event: error\ndata: {orjson.dumps({'detail': str(e)}).decode()}\n\n"
+        except Exception as e:
+            logger.exception(f"Error streaming query: {str(e)}")
+            error = {"detail": f"Error processing query: {str(e)}"}
+            yield f"event: error\ndata: {orjson.dumps(error).decode()}\n\n"
+        yield "data: [DONE]\n\n"
+    
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
 # Health Check endpoint -super useful in deployments
 @app.get("/health")
 async def health_check():
@@ -57,4 +106,5 @@ async def health_check():
     return {"status": "healthy"}
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
+    # uvloop and httptools come with uvicorn[standard] and cut event-loop and parsing overhead
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, loop="uvloop", http="httptools") 
\ No newline at end of file
@@ -1,12 +1,24 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 
 class QueryRequest(BaseModel):
     """Schema for the query request."""
     query: str = Field(..., description="The user's cooking or recipe query")
+    thread_id: Optional[str] = Field(None, description="Conversation thread; reusing it resumes a failed run and keeps earlier turns")
     
 class QueryResponse(BaseModel):
     """Schema for the query response."""
     response: str = Field(..., description="The response to the user's query")
     relevant: bool = Field(..., description="Whether the query was relevant to cooking")
     debug_info: Optional[Dict[str, Any]] = Field(None, description="Debug information about processing")
+
+class RoutingDecision(BaseModel):
+    """Schema for the planner's routing decision for a query."""
+    relevant: bool = Field(..., description="Whether the query is related to cooking, recipes, or food preparation")
+    needs_search: bool = Field(False, description="Whether a web search is needed to answer the query")
+    search_tool: Literal["search_recipes", "search_cooking_question"] = Field(
+        "search_recipes",
+        description="search_recipes for recipe requests, search_cooking_question for general cooking questions"
+    )
+    search_query: Optional[str] = Field(None, description="The query to search for, if a search is needed")
+    needs_cookware_extraction: bool = Field(False, description="Whether the query asks for a recipe whose required cookware should be checked")
@@ -1,12 +1,47 @@
+import re
 from typing import Dict, Any
 from langchain_core.tools import tool
 from utils.logging_utils import log_tool_call
 from utils.llm_utils import get_llm
-from config import AVAILABLE_COOKWARE
+from config import AVAILABLE_COOKWARE, EXTRACTION_MAX_TOKENS
 from langchain_core.messages import HumanMessage, SystemMessage
 
+# Lowercased cookware names mapped to their canonical form, built once at import
+_NORMALIZED_COOKWARE = {available.lower(): available for available in AVAILABLE_COOKWARE}
+
+# Matches any available cookware name inside an identified item, longest names first
+_COOKWARE_PATTERN = re.compile(
+    "|".join(re.escape(name) for name in sorted(_NORMALIZED_COOKWARE, key=len, reverse=True))
+)
+
+def _normalize_cookware(item: str) -> str:
+    """Map an identified item to the available cookware it names, or keep it as is."""
+    normalized_item = item.lower()
+    if normalized_item in _NORMALIZED_COOKWARE:
+        return _NORMALIZED_COOKWARE[normalized_item]
+    match = _COOKWARE_PATTERN.search(normalized_item)
+    if match:
+        return _NORMALIZED_COOKWARE[match.group(0)]
+    # The LLM may also use a shorter name, e.g. "pot" for "Little Pot"
+    for name, available in _NORMALIZED_COOKWARE.items():
+        if normalized_item in name:
+            return available
+    return item
+
+# Shared LLM client, so every extraction reuses the same connection pool. The list is
+# short, so cap the tokens it can spend rather than letting it run on.
+llm = get_llm().bind(max_tokens=EXTRACTION_MAX_TOKENS)
+
+# System message for cookware extraction, built once at import
+EXTRACTION_SYSTEM_MESSAGE = SystemMessage(content="""
+        You are a helpful cooking assistant that specializes in analyzing recipes.
+        Given a recipe text, identify all the cookware/tools needed to prepare it.
+        Return ONLY cookware items (pots, pans, utensils, etc.), not ingredients or appliances.
+        Be specific but concise in your identification.
+        """)
+
 @tool
-def extract_required_cookware(recipe: str) -> Dict[str, Any]:
+async def extract_required_cookware(recipe: str) -> Dict[str, Any]:
     """
     Extracts the required cookware needed to prepare a given recipe.
     
@@ -18,47 +53,28 @@ def extract_required_cookware(recipe: str) -> Dict[str, Any]:
     """
     log_tool_call("extract_required_cookware", {"recipe": recipe})
     
-    # Get LLM instance
-    llm = get_llm()
-    
     # Create messages for the LLM
     messages = [
-        SystemMessage(content="""
-        You are a helpful cooking assistant that specializes in analyzing recipes.
-        Given a recipe text, identify all the cookware/tools needed to prepare it.
-        Return ONLY cookware items (pots, pans, utensils, etc.), not ingredients or appliances.
-        Be specific but concise in your identification.
-        """),
+        EXTRACTION_SYSTEM_MESSAGE,
         HumanMessage(content=f"""
         Based on this recipe, what cookware is required to prepare it?
         
         RECIPE:
         {recipe}
         
-        List only the cookware items, one per line. Do not include ingredients or explanations.
+        List only the cookware items, one per line, with no headings or blank lines. Do not include ingredients or explanations.
         """)
     ]
     
-    # Call the LLM
-    response = llm.invoke(messages)
+    # Call the LLM asynchronously, so a timeout in the graph cancels the request itself
+    response = await llm.ainvoke(messages)
     
     # Parse the response to extract cookware items
     cookware_text = response.content.strip()
     cookware_list = [item.strip() for item in cookware_text.split('\n') if item.strip()]
     
-    # Check if any of the required cookware matches our available cookware list
-    # This is for normalization, as the LLM might use slightly different terminology
-    normalized_cookware = []
-    for item in cookware_list:
-        # Simple normalization - you might want to enhance this with more sophisticated matching
-        normalized_item = item.lower()
-        for available in AVAILABLE_COOKWARE:
-            if available.lower() in normalized_item or normalized_item in available.lower():
-                normalized_cookware.append(available)
-                break
-        else:
-            # If no match found, keep the original
-            normalized_cookware.append(item)
+    # Normalize against our available cookware, as the LLM might use slightly different terminology
+    normalized_cookware = [_normalize_cookware(item) for item in cookware_list]
     
     return {
         "required_cookware": normalized_cookware,
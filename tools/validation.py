@@ -1,29 +1,24 @@
-from typing import Dict, Any, List, ClassVar
+import asyncio
+import textwrap
+import orjson
+from operator import itemgetter
+from typing import Dict, Any, List, ClassVar, Optional, Tuple
+from langchain_core.runnables import RunnableParallel
 from langchain_core.tools import BaseTool
-from utils.logging_utils import log_tool_call
-from utils.llm_utils import get_llm
+from utils.logging_utils import log_tool_call, logger
+from utils.llm_utils import get_llm, get_classifier_llm
+from utils.cache import LRUCache, normalize_query
 from config import AVAILABLE_COOKWARE
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from pydantic import BaseModel
 
-class QueryInput(BaseModel):
-    query: str
-
-class ValidateQueryRelevance(BaseTool):
-    name: ClassVar[str] = "validate_query_relevance"
-    description: ClassVar[str] = "Determines if the query is related to cooking, recipes, or food preparation."
-    args_schema: ClassVar[type] = QueryInput
+# Available cookware as a set, for constant-time membership checks
+_COOKWARE = frozenset(AVAILABLE_COOKWARE)
 
-    def _run(self, query: str) -> Dict[str, Any]:
-        """Run the tool."""
-        log_tool_call("validate_query_relevance", {"query": query})
-        
-        # Get LLM instance
-        llm = get_llm()
-        
-        # Create messages for the LLM
-        messages = [
-            SystemMessage(content="""
+# Prompts for relevance classification, built once at import. They are dedented and
+# stripped to a canonical form and never change, and the query only ever appears at the
+# end of the HumanMessage, so providers' prompt prefix caches can match every call.
+CLASSIFIER_SYSTEM_MESSAGE = SystemMessage(content=textwrap.dedent("""
             You are a query classifier for a cooking and recipe application. 
             Your task is to determine if a user's query is related to cooking, recipes, food preparation, or ingredients.
             
@@ -42,40 +37,183 @@ class ValidateQueryRelevance(BaseTool):
             - Who won the Super Bowl?
             - What's the capital of France?
             - Can you help me with my homework?
-            """),
-            HumanMessage(content=f"Is this query cooking-related? Query: {query}")
-        ]
+            """).strip())
+EXPLANATION_SYSTEM_MESSAGE = SystemMessage(content=textwrap.dedent("""
+            You are a helpful cooking assistant. Briefly explain why a query is cooking-related.
+            Keep your explanation to one sentence.
+            """).strip())
+IRRELEVANT_EXPLANATION = "This query is not related to cooking, recipes, or food preparation."
+
+# Relevance results keyed by normalized query, so repeats skip both LLM calls
+_relevance_cache = LRUCache()
+
+class QueryInput(BaseModel):
+    query: str
+    include_explanation: bool = False
+
+class ValidateQueryRelevance(BaseTool):
+    name: ClassVar[str] = "validate_query_relevance"
+    description: ClassVar[str] = "Determines if the query is related to cooking, recipes, or food preparation."
+    args_schema: ClassVar[type] = QueryInput
+
+    def _run(self, query: str, include_explanation: bool = False) -> Dict[str, Any]:
+        """Run the tool."""
+        log_tool_call("validate_query_relevance", {"query": query, "include_explanation": include_explanation})
         
-        # Get classification from LLM
-        classification_response = llm.invoke(messages)
+        cache_key = normalize_query(query)
+        cached = self._cached_result(cache_key, include_explanation)
+        if cached is not None:
+            return cached
+        
+        messages, explanation_messages = self._build_messages(query)
+        classifier = get_classifier_llm()
+        
+        if include_explanation:
+            # Both calls run on the sync clients in the runnable's thread pool, so this never
+            # needs an event loop of its own (or conflicts with one already running)
+            responses = RunnableParallel(
+                classification=itemgetter("classification") | classifier,
+                explanation=itemgetter("explanation") | get_llm()
+            ).invoke({"classification": messages, "explanation": explanation_messages})
+            classification_response, explanation_response = responses["classification"], responses["explanation"]
+        else:
+            classification_response, explanation_response = classifier.invoke(messages), None
         
+        return self._store_result(cache_key, classification_response, explanation_response)
+
+    async def _arun(self, query: str, include_explanation: bool = False) -> Dict[str, Any]:
+        """Run the tool asynchronously."""
+        log_tool_call("validate_query_relevance", {"query": query, "include_explanation": include_explanation})
+        
+        cache_key = normalize_query(query)
+        cached = self._cached_result(cache_key, include_explanation)
+        if cached is not None:
+            return cached
+        
+        messages, explanation_messages = self._build_messages(query)
+        
+        # The classifier can only answer with a single "true" or "false" token
+        classifier = get_classifier_llm()
+        
+        if include_explanation:
+            # Request the explanation speculatively alongside the classification,
+            # so a relevant query costs one round-trip instead of two
+            classification_response, explanation_response = await asyncio.gather(
+                classifier.ainvoke(messages),
+                get_llm().ainvoke(explanation_messages)
+            )
+        else:
+            classification_response, explanation_response = await classifier.ainvoke(messages), None
+        
+        return self._store_result(cache_key, classification_response, explanation_response)
+
+    @staticmethod
+    def _cached_result(cache_key: str, include_explanation: bool) -> Optional[Dict[str, Any]]:
+        """Return the cached result if it can answer this call."""
+        cached = _relevance_cache.get(cache_key)
+        # A cached result without an explanation can't serve a caller that asked for one
+        if cached is not None and (cached["explanation"] is not None or not include_explanation):
+            # A copy, so callers mutating their result can't corrupt the cache
+            return dict(cached)
+        return None
+
+    @staticmethod
+    def _build_messages(query: str) -> Tuple[List[BaseMessage], List[BaseMessage]]:
+        """Create the classification and explanation prompts for a query."""
+        messages = [
+            CLASSIFIER_SYSTEM_MESSAGE,
+            HumanMessage(content=f"Is this query cooking-related? Query: {query}")
+        ]
+        explanation_messages = [
+            EXPLANATION_SYSTEM_MESSAGE,
+            HumanMessage(content=f"Briefly explain why this query is cooking-related: {query}")
+        ]
+        return messages, explanation_messages
+
+    @staticmethod
+    def _store_result(cache_key: str, classification_response: BaseMessage,
+                      explanation_response: Optional[BaseMessage]) -> Dict[str, Any]:
+        """Parse the LLM responses into a result and cache it."""
         # Parse the response to get a boolean
-        is_relevant = "true" in classification_response.content.lower()
-        
-        # If relevant, get a more detailed explanation
-        explanation = ""
-        if is_relevant:
-            explanation_messages = [
-                SystemMessage(content="""
-                You are a helpful cooking assistant. Briefly explain why a query is cooking-related.
-                Keep your explanation to one sentence.
-                """),
-                HumanMessage(content=f"Briefly explain why this query is cooking-related: {query}")
-            ]
-            explanation_response = llm.invoke(explanation_messages)
+        is_relevant = classification_response.content.strip().lower() == "true"
+        
+        # Only keep the explanation if the query turned out to be relevant;
+        # it stays None when the caller didn't ask for one
+        if not is_relevant:
+            explanation = IRRELEVANT_EXPLANATION
+        elif explanation_response is not None:
             explanation = explanation_response.content.strip()
         else:
-            explanation = "This query is not related to cooking, recipes, or food preparation."
+            explanation = None
         
-        return {
+        result = {
             "relevant": is_relevant,
             "explanation": explanation
         }
+        _relevance_cache.set(cache_key, dict(result))
+        return result
 
-    async def _arun(self, query: str) -> Dict[str, Any]:
-        """Run the tool asynchronously."""
-        # For now, just call the sync version
-        return self._run(query)
+    def cache_clear(self) -> None:
+        """Forget every cached relevance result, e.g. after the prompts or models change."""
+        _relevance_cache.clear()
+
+    async def classify_batch(self, queries: List[str]) -> List[bool]:
+        """
+        Classify several queries for relevance with a single LLM request.
+        
+        Args:
+            queries: The queries to classify
+        
+        Returns:
+            Whether each query is cooking-related, in the same order as queries
+        """
+        log_tool_call("validate_query_relevance.classify_batch", {"queries": queries})
+        
+        # Reuse cached classifications and only send the misses to the LLM
+        results: List[Optional[bool]] = []
+        misses = []
+        for index, query in enumerate(queries):
+            cached = _relevance_cache.get(normalize_query(query))
+            results.append(cached["relevant"] if cached is not None else None)
+            if cached is None:
+                misses.append(index)
+        if not misses:
+            return results
+        
+        numbered = "\n".join(f"{n}. {queries[index]}" for n, index in enumerate(misses, start=1))
+        response = await get_llm().ainvoke([
+            CLASSIFIER_SYSTEM_MESSAGE,
+            HumanMessage(content=(
+                "For each query below, decide if it is cooking-related. "
+                "Respond with ONLY a JSON array of true/false values, one per query, in order.\n"
+                f"{numbered}"
+            ))
+        ])
+        
+        try:
+            classifications = orjson.loads(response.content.strip().strip("`").removeprefix("json"))
+        except orjson.JSONDecodeError:
+            classifications = None
+        if (
+            not isinstance(classifications, list)
+            or len(classifications) != len(misses)
+            or not all(isinstance(is_relevant, bool) for is_relevant in classifications)
+        ):
+            # Fall back to classifying the misses one by one; _arun caches its own results
+            logger.warning("Batch classification response could not be parsed, classifying individually")
+            individual = await asyncio.gather(*(self._arun(queries[index]) for index in misses))
+            for index, result in zip(misses, individual):
+                results[index] = result["relevant"]
+            return results
+        
+        for index, is_relevant in zip(misses, classifications):
+            results[index] = is_relevant
+            # Cache like an _arun call without an explanation
+            _relevance_cache.set(normalize_query(queries[index]), {
+                "relevant": is_relevant,
+                "explanation": None if is_relevant else IRRELEVANT_EXPLANATION
+            })
+        return results
 
 class CookwareInput(BaseModel):
     required_tools: List[str]
@@ -89,7 +227,8 @@ class ValidateCookware(BaseTool):
         """Run the tool."""
         log_tool_call("validate_cookware", {"required_tools": required_tools})
         
-        missing_tools = [tool for tool in required_tools if tool not in AVAILABLE_COOKWARE]
+        # Checked against the precomputed set, keeping the order tools were requested in
+        missing_tools = [tool for tool in required_tools if tool not in _COOKWARE]
         can_cook = len(missing_tools) == 0
         
         return {
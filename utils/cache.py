@@ -0,0 +1,90 @@
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from config import CACHE_MAX_SIZE, SEMANTIC_CACHE_THRESHOLD
+from utils.llm_utils import get_embeddings
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so trivially different spellings share a cache key."""
+    return " ".join(query.lower().split())
+
+class LRUCache:
+    """In-memory LRU cache with an optional per-entry TTL."""
+
+    def __init__(self, maxsize: int = CACHE_MAX_SIZE, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss or expired entry."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store value under key, evicting the least recently used entry if full."""
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        self._data.clear()
+
+class SemanticCache:
+    """Cache that returns the value of the most similar previously seen query."""
+
+    def __init__(self, maxsize: int = CACHE_MAX_SIZE, threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        # Unit-length embeddings in a ring buffer, so a lookup is one matrix-vector product
+        self._vectors: Optional[np.ndarray] = None
+        self._values: List[Any] = [None] * maxsize
+        self._next = 0
+        self._count = 0
+        self._embeddings = None
+
+    async def _embed(self, query: str) -> np.ndarray:
+        if self._embeddings is None:
+            self._embeddings = get_embeddings()
+        vector = np.asarray(await self._embeddings.aembed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def aget(self, query: str) -> Tuple[Optional[Any], np.ndarray]:
+        """
+        Look up the closest cached query.
+
+        Returns:
+            The cached value (or None below the threshold) and the query's normalized
+            embedding, so a miss can be stored with set without embedding the query again.
+        """
+        vector = await self._embed(query)
+        if not self._count:
+            return None, vector
+        # Dot products of unit vectors are their cosine similarities
+        scores = self._vectors[:self._count] @ vector
+        best = int(np.argmax(scores))
+        if scores[best] >= self.threshold:
+            return self._values[best], vector
+        return None, vector
+
+    def set(self, vector: np.ndarray, value: Any) -> None:
+        """Store value under an embedding returned by aget, replacing the oldest entry if full."""
+        if self._vectors is None:
+            self._vectors = np.zeros((self.maxsize, vector.shape[0]), dtype=np.float32)
+        self._vectors[self._next] = vector
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self.maxsize
+        self._count = min(self._count + 1, self.maxsize)
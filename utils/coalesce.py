@@ -0,0 +1,24 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+# Work currently in flight, keyed by the caller-supplied identity
+_in_flight: Dict[str, asyncio.Future] = {}
+
+async def coalesce(key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Share one execution between concurrent callers with the same key.
+
+    Args:
+        key: Identifies duplicate work, e.g. a normalized query
+        factory: Creates the awaitable to run when nothing is in flight for key
+
+    Returns:
+        The result of the single shared execution
+    """
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _in_flight[key] = task
+        task.add_done_callback(lambda done: _in_flight.pop(key, None) if _in_flight.get(key) is done else None)
+    # Shield so one caller disconnecting doesn't cancel the work for the others
+    return await asyncio.shield(task)
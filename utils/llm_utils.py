@@ -1,9 +1,18 @@
-from langchain_openai import ChatOpenAI
-from config import MODEL_NAME, TEMPERATURE
+from functools import lru_cache
+import tiktoken
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+from config import (
+    MODEL_NAME, TEMPERATURE, EMBEDDING_MODEL,
+    ROUTER_MODEL_NAME, ROUTER_TEMPERATURE, ROUTER_MAX_TOKENS
+)
 
+@lru_cache(maxsize=8)
 def get_llm(temperature: float = TEMPERATURE, model: str = MODEL_NAME) -> ChatOpenAI:
     """
-    Returns a configured ChatOpenAI instance.
+    Returns a configured ChatOpenAI instance, shared by every caller using the same settings.
+    
+    Instances are cached per (temperature, model), so callers reuse one connection pool.
+    Call get_llm.cache_clear() after changing API keys or model settings at runtime.
     
     Args:
         temperature: The sampling temperature to use. Defaults to 0.0 for deterministic results.
@@ -15,4 +24,61 @@ def get_llm(temperature: float = TEMPERATURE, model: str = MODEL_NAME) -> ChatOp
     return ChatOpenAI(
         model=model,
         temperature=temperature
-    ) 
\ No newline at end of file
+    ) 
+
+@lru_cache(maxsize=None)
+def get_router_llm(model: str = ROUTER_MODEL_NAME) -> ChatOpenAI:
+    """
+    Returns the shared ChatOpenAI instance for cheap, low-latency routing decisions.
+    
+    Args:
+        model: The model to use. Defaults to the router model specified in config.py.
+    
+    Returns:
+        ChatOpenAI: A configured instance of the ChatOpenAI class.
+    """
+    return ChatOpenAI(
+        model=model,
+        temperature=ROUTER_TEMPERATURE,
+        max_tokens=ROUTER_MAX_TOKENS
+    )
+
+@lru_cache(maxsize=None)
+def get_classifier_llm(model: str = MODEL_NAME) -> ChatOpenAI:
+    """
+    Returns the shared ChatOpenAI instance for true/false classification.
+    
+    The answer is limited to a single token, and logit_bias restricts that token to
+    "true" or "false", so the model can't ramble and the reply can be compared exactly.
+    
+    Args:
+        model: The model to use. Defaults to the model specified in config.py.
+    
+    Returns:
+        ChatOpenAI: A configured instance of the ChatOpenAI class.
+    """
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Newer models tiktoken doesn't know yet use the gpt-4o encoding
+        encoding = tiktoken.get_encoding("o200k_base")
+    logit_bias = {encoding.encode(word)[0]: 100 for word in ("true", "false")}
+    return ChatOpenAI(
+        model=model,
+        temperature=0.0,
+        max_tokens=1,
+        logit_bias=logit_bias
+    )
+
+@lru_cache(maxsize=None)
+def get_embeddings(model: str = EMBEDDING_MODEL) -> OpenAIEmbeddings:
+    """
+    Returns the shared OpenAIEmbeddings instance for the given model.
+    
+    Args:
+        model: The embedding model to use. Defaults to the model specified in config.py.
+    
+    Returns:
+        OpenAIEmbeddings: A configured instance of the OpenAIEmbeddings class.
+    """
+    return OpenAIEmbeddings(model=model)
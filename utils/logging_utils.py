@@ -1,28 +1,71 @@
+import atexit
 import logging
-import json
+import time
+import orjson
+from logging.handlers import QueueHandler, QueueListener
+from queue import Queue
 from typing import Any, Dict
 
-# Configure logging
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter that reuses the formatted timestamp for every record within the same second."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._last_second = None
+        self._last_time = ""
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str = None) -> str:
+        if datefmt:
+            return super().formatTime(record, datefmt)
+        second = int(record.created)
+        if second != self._last_second:
+            self._last_second = second
+            self._last_time = time.strftime("%Y-%m-%d %H:%M:%S", self.converter(record.created))
+        return f"{self._last_time},{int(record.msecs):03d}"
+
+# Configure logging. Records are only enqueued on the calling thread; a background
+# listener formats and writes them, so slow stderr never blocks the event loop.
+_log_queue: Queue = Queue(-1)
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(CachedTimeFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+_queue_handler = QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))  # the listener adds the full format
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    handlers=[_queue_handler]
 )
+_log_listener = QueueListener(_log_queue, _stream_handler, respect_handler_level=True)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
 logger = logging.getLogger("recipe_app")
 
+def _dumps(data: Any) -> str:
+    """Serialize log data compactly, falling back to str() for unsupported types and keys."""
+    return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
 def log_step(step_name: str, data: Any = None) -> None:
     """Log a step in the processing pipeline."""
+    # Skip serialization entirely when the record would be dropped
+    if not logger.isEnabledFor(logging.INFO):
+        return
     if data:
         if isinstance(data, dict):
-            logger.info(f"STEP: {step_name} - {json.dumps(data, indent=2)}")
+            logger.info("STEP: %s - %s", step_name, _dumps(data))
         else:
-            logger.info(f"STEP: {step_name} - {data}")
+            logger.info("STEP: %s - %s", step_name, data)
     else:
-        logger.info(f"STEP: {step_name}")
+        logger.info("STEP: %s", step_name)
 
 def log_tool_call(tool_name: str, inputs: Dict[str, Any], outputs: Any = None) -> None:
     """Log a tool call with inputs and outputs."""
-    logger.info(f"TOOL CALL: {tool_name}")
-    logger.info(f"INPUTS: {json.dumps(inputs, indent=2)}")
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    # One record per call keeps concurrent tool calls from interleaving in the log
     if outputs:
-        logger.info(f"OUTPUTS: {json.dumps(outputs, indent=2) if isinstance(outputs, dict) else outputs}")
+        logger.info(
+            "TOOL CALL: %s | INPUTS: %s | OUTPUTS: %s",
+            tool_name, _dumps(inputs), _dumps(outputs) if isinstance(outputs, dict) else outputs
+        )
+    else:
+        logger.info("TOOL CALL: %s | INPUTS: %s", tool_name, _dumps(inputs))